@@ -1,24 +1,56 @@
+import os
+import re
 from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 from analysis import analysis_emotion
 from analysis import analysis_core
+from analysis import emotion_server
 from analysis import stats_calculator
 
+# Texts that carry no sentiment signal: empty/whitespace-only or URL-only
+URL_ONLY_RE = re.compile(r'^\s*(https?://\S+\s*)+$')
+
+def _is_trivial(text: str) -> bool:
+  return not text.strip() or URL_ONLY_RE.match(text) is not None
+
+# Below this many messages the stats run serially: forking workers and
+# pickling the enriched list costs more than the loops themselves
+PARALLEL_STATS_MIN_MESSAGES = 5000
+
 def analyze_full_chat(messages: list[dict], metadata: dict) -> dict:
   # Filter text-only messages
   text_messages = [m for m in messages if not m['is_media']]
   texts = [m['message'] for m in text_messages]
 
-  # Parallel processing of emotion and sentiment analysis
-  with ThreadPoolExecutor(max_workers=2) as executor:
-    emotion_future = executor.submit(analysis_emotion.analyze_emotion_batch, texts)
-    sentiment_future = executor.submit(lambda: [analysis_core.get_vader_scores(t) for t in texts])
-    
-    emotion_results = emotion_future.result()
-    sentiment_results = sentiment_future.result()
-  
-  dominant_emotion_results = [analysis_emotion.get_dominant_emotion(emo_dict) 
-                              for emo_dict in emotion_results]
+  # Deduplicate texts before scoring: chats repeat the same short messages
+  # ("ok", "lol", single emojis) many times, so score each unique text once
+  # and fan results back out through an index map. Trivial texts (empty or
+  # URL-only, often 10-30% of a chat) skip the models entirely and get a
+  # precomputed neutral result.
+  trivial = [_is_trivial(t) for t in texts]
+  idx_of = {}
+  for text, is_trivial in zip(texts, trivial):
+    if not is_trivial and text not in idx_of:
+      idx_of[text] = len(idx_of)
+  unique_texts = list(idx_of)
+
+  # Parallel processing of emotion and sentiment analysis.
+  # VADER is pure Python (GIL-bound), so a thread gives no real overlap with
+  # the transformer: ship it to a worker process instead and keep the emotion
+  # model in this process so its weights stay resident across requests.
+  with ProcessPoolExecutor(max_workers=1) as executor:
+    sentiment_future = executor.submit(analysis_core.get_vader_scores_batch, unique_texts)
+    unique_emotion_results = emotion_server.server.analyze(unique_texts)
+    unique_sentiment_results = sentiment_future.result()
+
+  emotion_results = [analysis_emotion.NEUTRAL_EMOTION_SCORES if is_trivial
+                     else unique_emotion_results[idx_of[text]]
+                     for text, is_trivial in zip(texts, trivial)]
+  sentiment_results = [analysis_core.NEUTRAL_SENTIMENT_SCORES if is_trivial
+                       else unique_sentiment_results[idx_of[text]]
+                       for text, is_trivial in zip(texts, trivial)]
+
+  dominant_emotion_results = analysis_emotion.get_dominant_emotions_batch(emotion_results)
 
   # Enrich messages with emotion and sentiment data
   enriched = []
@@ -38,28 +70,48 @@ def analyze_full_chat(messages: list[dict], metadata: dict) -> dict:
       })
       text_idx += 1
 
-  # 4. Calculate user emotion stats 
+  # Run spaCy over every text message once and cache the lemmas on the
+  # message, so word stats reuse them instead of re-parsing per message
+  text_indices = [i for i, msg in enumerate(enriched)
+                  if not msg['is_media'] and msg['message']]
+  lemma_stream = analysis_core.process_texts_spacy_batch(
+      [enriched[i]['message'] for i in text_indices],
+      pos_list=['NOUN', 'VERB', 'ADJ', 'ADV'])
+  for i, cleaned in zip(text_indices, lemma_stream):
+    enriched[i]['_lemmas'] = cleaned.split()
+
+  # 4-5. Per-user and overall emotion stats plus the top-emoji/top-word
+  # scans are independent full passes over the message list; on large chats
+  # fan them out to a process pool so they run on separate cores
   users = metadata['users']
-  user_emotion_stats = {}
-  for user_name in users:
-      emotion_stats = stats_calculator.calculate_user_emotion_stats(enriched, user_name)
-      user_emotion_stats[user_name] = emotion_stats
+  if len(enriched) >= PARALLEL_STATS_MIN_MESSAGES:
+    with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
+      user_stats_future = pool.submit(stats_calculator.calculate_emotion_stats_by_user, enriched, users)
+      overall_dist_future = pool.submit(stats_calculator.calculate_overall_emotion_distribution, enriched)
+      emojis_future = pool.submit(stats_calculator.top_emojis, enriched, metadata, 10)
+      words_future = pool.submit(stats_calculator.top_words_per_user, enriched, metadata, 20)
+      user_emotion_stats = user_stats_future.result()
+      overall_emotion_dist = overall_dist_future.result()
+      top_emojis_per_user = emojis_future.result()
+      top_words_per_user = words_future.result()
+  else:
+    user_emotion_stats = stats_calculator.calculate_emotion_stats_by_user(enriched, users)
+    overall_emotion_dist = stats_calculator.calculate_overall_emotion_distribution(enriched)
+    top_emojis_per_user = stats_calculator.top_emojis(enriched, metadata, N=10)
+    top_words_per_user = stats_calculator.top_words_per_user(enriched, metadata, N=20)
 
-  # 5. Overall emotion stats
-  overall_emotion_dist = stats_calculator.calculate_overall_emotion_distribution(enriched)
-  
   # 6. Calculate overall sentiment (pos, neu, neg, compound)
   overall_sentiment = analysis_emotion.calculate_overall_sentiment(enriched)
 
-  # 7. Additional statistics
+  # 7. Additional statistics: one fused call builds the columnar view in a
+  # single pass and derives every counting stat from it
+  basic_stats = stats_calculator.compute_all_basic_stats(enriched, metadata)
   messages_per_day = stats_calculator.calculate_avg_messages_per_day(metadata)
-  hourly_distribution = stats_calculator.compute_messages_per_hours_category(enriched)
-  weekday_distribution = stats_calculator.compute_avg_and_count_messages_by_day(enriched, metadata)
-  longest_streak = stats_calculator.compute_longest_conversation_streak(enriched, metadata)
-  messages_per_user = stats_calculator.messages_per_user(enriched, metadata)
-  avg_msg_length = stats_calculator.avg_message_length_per_user(enriched, metadata)
-  top_emojis_per_user = stats_calculator.top_emojis(enriched, metadata, N=10)
-  top_words_per_user = stats_calculator.top_words_per_user(enriched, metadata, N=20)
+  hourly_distribution = basic_stats['hourly_distribution']
+  weekday_distribution = basic_stats['weekday_distribution']
+  longest_streak = basic_stats['longest_streak']
+  messages_per_user = basic_stats['messages_per_user']
+  avg_msg_length = basic_stats['avg_message_length_per_user']
 
   # Prepare response metadata with anonymized user mappings
   sorted_users = sorted(metadata['users'])
@@ -77,24 +129,21 @@ def analyze_full_chat(messages: list[dict], metadata: dict) -> dict:
       'media_by_user': metadata['media_by_user']
   }
 
-  # Apply user anonymization to all statistics
-  user_emotion_stats_generic = {reverse_mapping[user]: stats for user, stats in user_emotion_stats.items()}
-  messages_per_user_generic = {reverse_mapping[user]: count for user, count in messages_per_user.items()}
-  avg_msg_length_generic = {reverse_mapping[user]: avg for user, avg in avg_msg_length.items()}
-  top_emojis_generic = {reverse_mapping[user]: emojis for user, emojis in top_emojis_per_user.items()}
-  top_words_generic = {reverse_mapping[user]: words for user, words in top_words_per_user.items()}
+  # Apply user anonymization to all per-user statistics in one place
+  def anonymize(per_user: dict) -> dict:
+    return {reverse_mapping[user]: value for user, value in per_user.items()}
 
   return {
       'metadata': metadata_output,
-      'user_emotion_stats': user_emotion_stats_generic,
+      'user_emotion_stats': anonymize(user_emotion_stats),
       'overall_emotion_distribution': overall_emotion_dist,
       'overall_sentiment': overall_sentiment,
       'messages_per_day': messages_per_day,
       'hourly_distribution': hourly_distribution,
       'weekday_distribution': weekday_distribution,
       'longest_streak': longest_streak,
-      'messages_per_user': messages_per_user_generic,
-      'avg_message_length_per_user': avg_msg_length_generic,
-      'top_emojis_per_user': top_emojis_generic,
-      'top_words_per_user': top_words_generic
+      'messages_per_user': anonymize(messages_per_user),
+      'avg_message_length_per_user': anonymize(avg_msg_length),
+      'top_emojis_per_user': anonymize(top_emojis_per_user),
+      'top_words_per_user': anonymize(top_words_per_user)
   }
\ No newline at end of file
@@ -9,28 +9,105 @@ def get_nlp():
     import spacy
     return spacy.load('en_core_web_sm', disable=['parser', 'ner'])
 
+def warmup():
+    """Load spaCy and prime VADER so the first request doesn't pay for it."""
+    get_nlp()('warmup')
+    analyzer.polarity_scores('warmup')
+
+
 # ------------ Text Processing ------------
-def process_text_spacy(text: str, pos_list: list) -> str:
+
+# POS kept by default: content words only (PROPN excluded to drop names)
+DEFAULT_POS = frozenset(('NOUN', 'VERB', 'ADJ', 'ADV'))
+
+def process_text_spacy(text: str, pos_list=DEFAULT_POS) -> str:
     nlp = get_nlp()
+    pos_set = frozenset(pos_list)
     doc = nlp(text)
     output = [
         token.lemma_
         for token in doc
-        if not token.is_stop and token.pos_ in pos_list
+        if not token.is_stop and token.pos_ in pos_set
     ]
-    return ' '.join(output)
+    # One lower() on the joined string: consumers compare lemmas
+    # case-exactly (stopword filters, word counts)
+    return ' '.join(output).lower()
+
+
+def process_texts_spacy_batch(texts: list[str], pos_list=DEFAULT_POS, batch_size: int = 1000):
+    """
+    Lemmatize a batch of texts with nlp.pipe, which amortizes pipeline
+    dispatch across texts instead of paying it per call.
+
+    Yields one cleaned string per input text, in order.
+    """
+    nlp = get_nlp()
+    pos_set = frozenset(pos_list)
+    for doc in nlp.pipe(texts, batch_size=batch_size):
+        yield ' '.join(
+            token.lemma_
+            for token in doc
+            if not token.is_stop and token.pos_ in pos_set
+        ).lower()
 
 # ------------ Sentiment Analysis with VADER ------------
 analyzer = SentimentIntensityAnalyzer()
 
+# VADER 3.3.1+ has a pathological (near-quadratic) slowdown on texts packed
+# with emojis/emoticons. Cap the text length and collapse long runs of the
+# same emoji before scoring; sentiment is unaffected by the 4th+ repeat.
+_SAFE_LEN = 2000
+_EMOJI_RUN = re.compile(r'([^\x00-\x7F])\1{3,}')
+
+# Precomputed scores for trivial texts (empty/URL-only) that skip VADER;
+# matches what polarity_scores returns for an empty string
+NEUTRAL_SENTIMENT_SCORES = {
+    "sentiment_neg": 0.0,
+    "sentiment_neu": 0.0,
+    "sentiment_pos": 0.0,
+    "sentiment_compound": 0.0
+}
+
+
+def _sanitize_for_vader(text: str) -> str:
+    if len(text) > _SAFE_LEN:
+        text = text[:_SAFE_LEN]
+    return _EMOJI_RUN.sub(r'\1\1\1', text)
+
+
+@lru_cache(maxsize=100_000)
+def _vader_raw(text: str) -> tuple:
+    """Cached VADER scores as a (neg, neu, pos, compound) tuple.
+
+    polarity_scores re-tokenizes and re-scans the lexicon on every call, so
+    repeated short messages (very common in chats) become one dict lookup.
+    A tuple is returned because the cached value must be immutable.
+    """
+    scores = analyzer.polarity_scores(text)
+    return (scores['neg'], scores['neu'], scores['pos'], scores['compound'])
+
+
 def get_vader_scores(text: str) -> dict:
-    original_scores = analyzer.polarity_scores(text)
+    # Raw scores: per-message values only feed aggregations, which round
+    # their own output at the API boundary
+    neg, neu, pos, compound = _vader_raw(_sanitize_for_vader(text))
     renamed_scores = {
-        "sentiment_neg": round(original_scores['neg'], 2),
-        "sentiment_neu": round(original_scores['neu'], 2),
-        "sentiment_pos": round(original_scores['pos'], 2),
-        "sentiment_compound": round(original_scores['compound'], 2)
+        "sentiment_neg": neg,
+        "sentiment_neu": neu,
+        "sentiment_pos": pos,
+        "sentiment_compound": compound
     }
     return renamed_scores
 
 
+def get_vader_scores_batch(texts: list[str]) -> list[dict]:
+    """
+    Score a batch of texts with VADER.
+
+    Module-level (picklable) so it can be shipped to a worker process:
+    VADER is pure Python and holds the GIL, so running it in a separate
+    process lets it truly overlap with transformer inference.
+    """
+    return [get_vader_scores(t) for t in texts]
+
+
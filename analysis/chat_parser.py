@@ -15,8 +15,9 @@ Output: List of dictionaries with timestamp, user, message, type of media
 """
 
 import re
+from bisect import bisect_left, bisect_right
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, TextIO, Tuple
 
 
 # ============================================================================
@@ -28,8 +29,13 @@ from typing import List, Dict, Optional, Tuple
 # Supported formats:
 #   - "11/10/2024, 14:23 - Mario Rossi: Ciao"
 #   - "10/11/2024, 2:23 PM - John Doe: Hello"
+# Whitespace inside the header is [^\S\n] (space/tab, never newline): the
+# pattern is also run over the whole export at once, where a bare \s after
+# the colon of an empty-message header would swallow the newline and
+# consume the next header line as this message's text
 WHATSAPP_LINE_PATTERN = re.compile(
-    r'^(\d{1,2}/\d{1,2}/\d{4}),\s(\d{1,2}:\d{2}(?:\s?[AP]M)?)\s-\s(.+?):\s(.*)$',
+    r'^(\d{1,2}/\d{1,2}/\d{4}),[^\S\n](\d{1,2}:\d{2}(?:[^\S\n]?[AP]M)?)'
+    r'[^\S\n]-[^\S\n](.+?):[^\S\n](.*)$',
     re.MULTILINE
 ) #re.come creates a reusable regular expression object
 
@@ -58,84 +64,80 @@ MEDIA_PATTERNS = {
     'document': [r'document omitted', r'\.pdf', r'\.docx']
 }
 
+# The lists above are kept as the readable source of truth; at import time
+# they are fused into two alternation regexes so each message needs a single
+# .search() instead of up to 27 separate re.search calls
+_SYSTEM_RE = re.compile('|'.join(SYSTEM_MESSAGE_PATTERNS), re.IGNORECASE)
+_MEDIA_RE = re.compile(
+    '|'.join(f"(?P<{media_type}>{'|'.join(patterns)})"
+             for media_type, patterns in MEDIA_PATTERNS.items()),
+    re.IGNORECASE
+)
+
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+# Time component of a header: "14:23" or "2:23 PM"
+_TIME_RE = re.compile(r'^(\d{1,2}):(\d{2})(?:\s?([AP])M)?$', re.IGNORECASE)
+
 def parse_timestamp(date_str: str, time_str: str) -> Optional[datetime]:
     """
     Converts date/time strings to datetime object.
-    
+
     Supported formats:
     - Italian: "11/10/2024", "14:23"
     - English 12h: "10/11/2024", "2:23 PM"
     - English 24h: "10/11/2024", "14:23"
-    
+
     Args:
         date_str: date string in "dd/mm/yyyy" or "mm/dd/yyyy" format
         time_str: time string in "HH:MM" or "H:MM AM/PM" format
-    
+
     Returns:
         datetime object or None if parsing fails
     """
-    # Try Italian 24h format (most common in EU)
+    # Parse the pieces with int() and a small regex instead of a cascade of
+    # up to four strptime calls: strptime re-interprets its format string on
+    # every call and signals mismatch by raising, which made the old version
+    # throw and catch hundreds of thousands of ValueErrors on big chats.
     try:
-        dt_str = f"{date_str} {time_str}"
-        return datetime.strptime(dt_str, "%d/%m/%Y %H:%M")
-
+        first, second, year = map(int, date_str.split('/'))
     except ValueError:
-        pass
-    
-    # Try English 12h format with AM/PM
-    try:
-        dt_str = f"{date_str} {time_str}"
-        return datetime.strptime(dt_str, "%m/%d/%Y %I:%M %p")
-    except ValueError:
-        pass
-    
-    # Try English 24h format
+        return None
+
+    time_match = _TIME_RE.match(time_str.strip())
+    if time_match is None:
+        return None
+    hour, minute = int(time_match[1]), int(time_match[2])
+
+    if time_match[3]:
+        # 12h clock implies the English export, so month/day ordering
+        hour = hour % 12 + (12 if time_match[3] in 'pP' else 0)
+        try:
+            return datetime(year, first, second, hour, minute)
+        except ValueError:
+            return None
+
+    # 24h clock: try Italian day/month first (most common in EU), then the
+    # reversed English ordering
     try:
-        dt_str = f"{date_str} {time_str}"
-        return datetime.strptime(dt_str, "%m/%d/%Y %H:%M")
+        return datetime(year, second, first, hour, minute)
     except ValueError:
         pass
-    
-    # Fallback: try reversing day/month
     try:
-        dt_str = f"{date_str} {time_str.replace(' ', '')}"
-        return datetime.strptime(dt_str, "%d/%m/%Y %H:%M")
+        return datetime(year, first, second, hour, minute)
     except ValueError:
         return None
 
-def get_hour_category(timestamp: datetime) -> str:
-    if not timestamp:
-        return ""
-
-    # HOURS intervals: [08-10) [10, 12)
-    HOURS = ["00-02", "02-04", "04-06", "06-08", "08-10", "10-12",
-              "12-14", "14-16", "16-18", "18-20", "20-22", "22-24"]
-    
-    category_index = timestamp.hour // 2
-    return HOURS[category_index]
-
-def weekday_from_int_to_string(weekday: int) -> str:
-    if weekday == 0:
-        return "Monday"
-    elif weekday == 1:
-        return "Tuesday"
-    elif weekday == 2:
-        return "Wednesday"
-    elif weekday == 3:
-        return "Thursday"
-    elif weekday == 4:
-        return "Friday"
-    elif weekday == 5:
-        return "Saturday"
-    elif weekday == 6:
-        return "Sunday"
-    else:
-        return "Invalid day number"
+# Constant lookup tables indexed by datetime.weekday() and hour // 2.
+# These replace the old weekday_from_int_to_string if/elif chain and the
+# get_hour_category helper, which rebuilt its HOURS list on every call.
+_WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday",
+             "Friday", "Saturday", "Sunday")
+_HOURS = ("00-02", "02-04", "04-06", "06-08", "08-10", "10-12",
+          "12-14", "14-16", "16-18", "18-20", "20-22", "22-24")
 
 def detect_media_type(message_text: str) -> Tuple[bool, Optional[str]]:
     """
@@ -155,13 +157,10 @@ def detect_media_type(message_text: str) -> Tuple[bool, Optional[str]]:
         >>> detect_media_type("Ciao come stai?")
         (False, None)
     """
-    message_lower = message_text.lower()
-    
-    for media_type, patterns in MEDIA_PATTERNS.items():
-        for pattern in patterns:
-            if re.search(pattern, message_lower, re.IGNORECASE):
-                return True, media_type
-    
+    match = _MEDIA_RE.search(message_text)
+    if match:
+        # lastgroup is the named group that matched, i.e. the media type
+        return True, match.lastgroup
     return False, None
 
 
@@ -181,16 +180,74 @@ def is_system_message(message_text: str) -> bool:
         >>> is_system_message("Ciao ragazzi!")
         False
     """
-    for pattern in SYSTEM_MESSAGE_PATTERNS:
-        if re.search(pattern, message_text, re.IGNORECASE):
-            return True
-    return False
+    return _SYSTEM_RE.search(message_text) is not None
 
 
 # ============================================================================
 # MAIN FUNCTION
 # ============================================================================
 
+def _build_message(
+    match: re.Match,
+    body: str,
+    skip_system_messages: bool,
+    preserve_media_messages: bool
+) -> Optional[Dict]:
+    """
+    Builds one message dict from a header regex match plus the raw text that
+    follows it up to the next header (the multiline continuation lines).
+
+    Returns None if the timestamp cannot be parsed or the message is
+    filtered out by the skip/preserve flags, so the caller appends kept
+    messages in a single pass with no second filtering sweep.
+    """
+    date_str, time_str, user_name, message_text = match.groups()
+
+    # Parse timestamp
+    timestamp = parse_timestamp(date_str, time_str)
+    if timestamp is None:
+        # If parsing fails, skip message (may be unsupported format)
+        return None
+
+    message_text = message_text.strip()
+
+    # Detect system messages and media (on the header line, as before:
+    # media placeholders and system notices are always single-line), and
+    # bail out before doing any more work if the message is filtered anyway
+    is_sys = is_system_message(message_text)
+    if skip_system_messages and is_sys:
+        return None
+    is_media, media_type = detect_media_type(message_text)
+    if not preserve_media_messages and is_media:
+        return None
+
+    # number of characthers (first line only, as before)
+    number_of_characthers = len(message_text)
+
+    # Append the multiline continuation, one stripped line per row
+    if body:
+        continuation = '\n'.join(
+            line.strip() for line in body.split('\n') if line.strip()
+        )
+        if continuation:
+            message_text += '\n' + continuation
+
+    return {
+        'timestamp': timestamp,
+        # Integer day (date.toordinal()) so the stats layer can group and
+        # compare days without allocating a date object per message
+        'date_ord': timestamp.toordinal(),
+        'weekday': _WEEKDAYS[timestamp.weekday()],
+        'hour_category': _HOURS[timestamp.hour >> 1],
+        'user': user_name.strip(),
+        'message': message_text,
+        'message_length': number_of_characthers,
+        'is_media': is_media,
+        'media_type': media_type,
+        'is_system': is_sys
+    }
+
+
 def parse_whatsapp_export(
     file_content: str,
     skip_system_messages: bool = True,
@@ -224,90 +281,153 @@ def parse_whatsapp_export(
         True
     """
     messages = []
-    lines = file_content.split('\n')
-    
-    current_message = None  # Tracks current message to handle multiline
-    
-    for line in lines:
-        line = line.strip()
-        if not line:  # Skip empty lines
-            continue
-        
-        # Try to match with WhatsApp pattern (new message line)
+
+    # One C-level regex sweep over the whole export: the pattern is anchored
+    # at line starts (MULTILINE), so every match is a message header and the
+    # text between two consecutive headers is the multiline message body.
+    # This replaces the old per-line split/strip/match loop and its millions
+    # of intermediate string objects on large chats.
+    previous_match = None
+    for match in WHATSAPP_LINE_PATTERN.finditer(file_content):
+        if previous_match is not None:
+            body = file_content[previous_match.end():match.start()]
+            message = _build_message(previous_match, body,
+                                     skip_system_messages, preserve_media_messages)
+            if message is not None:
+                messages.append(message)
+        previous_match = match
+
+    # Build the last message (its body runs to the end of the file)
+    if previous_match is not None:
+        body = file_content[previous_match.end():]
+        message = _build_message(previous_match, body,
+                                 skip_system_messages, preserve_media_messages)
+        if message is not None:
+            messages.append(message)
+
+    return messages
+
+
+def parse_whatsapp_export_stream(
+    fp: TextIO,
+    skip_system_messages: bool = True,
+    preserve_media_messages: bool = True
+) -> List[Dict]:
+    """
+    Streaming variant of parse_whatsapp_export for file-like input.
+
+    Reads one line at a time from an open text handle instead of holding
+    the whole export in memory, so peak RSS stays at one message rather
+    than the full file. Use this when parsing directly from disk; when the
+    content is already a string, parse_whatsapp_export's single regex
+    sweep over it is faster. Output is identical.
+    """
+    messages = []
+    current_match = None
+    body_lines: List[str] = []
+
+    for line in fp:
+        line = line.rstrip('\n')
         match = WHATSAPP_LINE_PATTERN.match(line)
-        
         if match:
-            # It's a new message line: save the previous one if it exists
-            if current_message is not None:
-                messages.append(current_message)
-            
-            # Extract components from match
-            date_str, time_str, user_name, message_text = match.groups()
-            
-            # Parse timestamp
-            timestamp = parse_timestamp(date_str, time_str)
-            if timestamp is None:
-                # If parsing fails, skip message (may be unsupported format)
-                continue
-
-            # Hour category
-            hour_category = get_hour_category(timestamp)     
-
-            # weekday
-            weekday = weekday_from_int_to_string(timestamp.weekday())
-
-            # number of characthers
-            number_of_characthers = len(message_text)
-
-            # Detect media
-            is_media, media_type = detect_media_type(message_text)
-            
-            # Detect system messages
-            is_sys = is_system_message(message_text)
-            
-            # Create message structure
-            current_message = {
-                'timestamp': timestamp,
-                'weekday': weekday,
-                'hour_category': hour_category,
-                'user': user_name.strip(),
-                'message': message_text.strip(),
-                'message_length': number_of_characthers,
-                'is_media': is_media,
-                'media_type': media_type,
-                'is_system': is_sys
-            }
-        
-        else:
-            # Not a new line: it's a multiline continuation of the previous message
-            if current_message is not None:
-                # Append to the 'message' key of the current message
-                current_message['message'] += '\n' + line
-    
-    # Add the last message if it exists
-    if current_message is not None:
-        messages.append(current_message)
-    
-    # Optional filtering
-    filtered_messages = []
-    for msg in messages:
-        # Skip system messages if requested
-        if skip_system_messages and msg['is_system']:
-            continue
-        
-        # Skip media messages if requested
-        if not preserve_media_messages and msg['is_media']:
-            continue
-        
-        filtered_messages.append(msg)
-    
-    return filtered_messages
+            if current_match is not None:
+                message = _build_message(current_match, '\n'.join(body_lines),
+                                         skip_system_messages, preserve_media_messages)
+                if message is not None:
+                    messages.append(message)
+            current_match = match
+            body_lines = []
+        elif current_match is not None:
+            # Continuation row of a multiline message
+            body_lines.append(line)
+
+    if current_match is not None:
+        message = _build_message(current_match, '\n'.join(body_lines),
+                                 skip_system_messages, preserve_media_messages)
+        if message is not None:
+            messages.append(message)
+
+    return messages
 
 
 # ============================================================================
 # UTILITY FUNCTIONS FOR ANALYSIS
 # ============================================================================
 
+def get_user_index(messages: List[Dict]) -> Dict[str, List[int]]:
+    """
+    Builds a {user: [message indices]} map in one pass over the chat.
+
+    Callers slicing the timeline for several users should build this once
+    and reuse it: each per-user lookup is then just an index gather instead
+    of a fresh linear scan over all messages.
+
+    Args:
+        messages: message list from parse_whatsapp_export()
+
+    Returns:
+        Dict mapping each user name to the indices of their messages,
+        in chat order.
+    """
+    user_index: Dict[str, List[int]] = {}
+    for i, msg in enumerate(messages):
+        user_index.setdefault(msg['user'], []).append(i)
+    return user_index
+
+
+def filter_messages_by_user(
+    messages: List[Dict],
+    user_name: str,
+    user_index: Optional[Dict[str, List[int]]] = None
+) -> List[Dict]:
+    """
+    Returns the messages sent by one user.
+
+    Args:
+        messages: message list from parse_whatsapp_export()
+        user_name: user to filter for
+        user_index: optional precomputed map from get_user_index(); pass it
+            when filtering for several users to avoid rescanning the chat
+
+    Returns:
+        List of that user's messages, in chat order.
+    """
+    if user_index is None:
+        user_index = get_user_index(messages)
+    return [messages[i] for i in user_index.get(user_name, [])]
+
+
+def filter_messages_by_date_range(
+    messages: List[Dict],
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    Returns the messages whose timestamp falls in [start_date, end_date].
+
+    Exports are chronological, so the bounds are located with bisect in
+    O(log N) and the result is one contiguous slice — no per-message
+    comparison loop.
+
+    Args:
+        messages: message list from parse_whatsapp_export()
+        start_date: inclusive lower bound, or None for no lower bound
+        end_date: inclusive upper bound, or None for no upper bound
+
+    Returns:
+        List of messages in the range, in chat order.
+    """
+    if not messages:
+        return []
+    lo = 0
+    hi = len(messages)
+    if start_date is not None:
+        lo = bisect_left(messages, start_date, key=lambda m: m['timestamp'])
+    if end_date is not None:
+        hi = bisect_right(messages, end_date, key=lambda m: m['timestamp'])
+    return messages[lo:hi]
+
+
 def get_chat_metadata(messages: List[Dict]) -> Dict:
     """
     Extracts general metadata from parsed chat.
@@ -0,0 +1,81 @@
+"""
+Persistent emotion-inference worker with cross-request batching.
+
+A single background thread owns the emotion classifier and pulls queued
+requests off a queue. When several chats are being analyzed concurrently,
+their texts are concatenated into one batched classifier call and the
+results are sliced back per request (dynamic batching), instead of each
+request re-entering the model serially.
+
+The analysis path is synchronous (analyze_full_chat), so the worker is a
+plain thread with concurrent.futures.Future handoff rather than an asyncio
+queue; ONNX Runtime releases the GIL during inference, so the worker thread
+does not block request handling.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List
+
+from analysis import analysis_emotion
+
+# How many queued requests may be fused into one classifier call
+MAX_REQUESTS_PER_BATCH = 8
+
+
+class EmotionServer:
+    """Single worker thread that owns the model and batches across requests."""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker thread (idempotent; also called lazily)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._serve, name="emotion-server", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue a batch of texts; the Future resolves to the score dicts."""
+        self.start()
+        future: Future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def analyze(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Blocking helper: queue the texts and wait for their results."""
+        return self.submit(texts).result()
+
+    def _serve(self):
+        while True:
+            # Block for the first request, then drain whatever else is
+            # already queued so concurrent requests share one model call
+            pending = [self._queue.get()]
+            while len(pending) < MAX_REQUESTS_PER_BATCH:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            all_texts = [text for texts, _ in pending for text in texts]
+            try:
+                all_results = analysis_emotion.analyze_emotion_batch(all_texts)
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+
+            # Slice the fused results back out per request
+            offset = 0
+            for texts, future in pending:
+                future.set_result(all_results[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+# Module-level singleton shared by all requests in this process
+server = EmotionServer()
@@ -1,29 +1,85 @@
 import emoji
 import re
-from collections import defaultdict
-from analysis.analysis_core import process_text_spacy
+import numpy as np
+from collections import Counter
+from dataclasses import dataclass
+from analysis.analysis_core import process_texts_spacy_batch
 
 # CONSTANTS
 STRONG_EMOTION_THRESHOLD = 0.30  # Minimum score for strong emotion detection
 MIN_WORD_LENGTH = 2  # Minimum word length for analysis
 PERCENTAGE_MULTIPLIER = 100  # For percentage calculations
 
-# HELPERS
-def __emotion_avg(scores: list[int]) -> float:
-     if not scores:
-          return 0.0
-     return sum(scores) / len(scores)
+HOURS_CATEGORIES = ("00-02", "02-04", "04-06", "06-08", "08-10", "10-12",
+                    "12-14", "14-16", "16-18", "18-20", "20-22", "22-24")
+_HOUR_INDEX = {h: i for i, h in enumerate(HOURS_CATEGORIES)}
 
-def __emotion_frequency(user_messages: list[dict], emotion: str) -> int:
-     return sum(1 for msg in user_messages 
-                if msg.get('dominant_emotion') and
-                msg.get('dominant_emotion')[0] == emotion)
+# GoEmotions 28 emotions (Google Research dataset), in model label order
+EMOTIONS = ('admiration', 'amusement', 'anger', 'annoyance', 'approval',
+            'caring', 'confusion', 'curiosity', 'desire', 'disappointment',
+            'disapproval', 'disgust', 'embarrassment', 'excitement', 'fear',
+            'gratitude', 'grief', 'joy', 'love', 'nervousness', 'optimism',
+            'pride', 'realization', 'relief', 'remorse', 'sadness',
+            'surprise', 'neutral')
+EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTIONS)}
 
-def __emotion_percentage(frequency: int, user_messages: list[dict]) -> float:
-     if not user_messages:
-          return 0.0
-     return frequency/len(user_messages) * PERCENTAGE_MULTIPLIER
+# date(1970, 1, 1).toordinal(): offset between proleptic ordinals and the
+# numpy datetime64 epoch
+_EPOCH_ORDINAL = 719163
+
+
+# ------------ Columnar (SoA) view over enriched messages ------------
+@dataclass
+class EnrichedColumns:
+     """
+     Struct-of-arrays view over the enriched message list.
+
+     The per-message dicts stay the source of truth, but packing the hot
+     fields into parallel NumPy arrays once lets the counting stats run as
+     vectorized column operations instead of N dict lookups per function.
+     """
+     users: list[str]          # unique users, sorted
+     user_codes: np.ndarray    # int32 index into users (-1 if unknown)
+     msg_lengths: np.ndarray   # int32, characters per message
+     hour_codes: np.ndarray    # int8 index into HOURS_CATEGORIES (-1 if missing)
+     is_media: np.ndarray      # bool
+     dates: np.ndarray         # datetime64[D], calendar day of the message
+     weekday_codes: np.ndarray # int8, 0 = Monday ... 6 = Sunday
+
+
+def build_columns(enriched_messages: list[dict], metadata: dict) -> EnrichedColumns:
+     """Builds the columnar view in a single pass over the messages."""
+     users = sorted(metadata['users'])
+     user_index = {u: i for i, u in enumerate(users)}
+
+     n = len(enriched_messages)
+     user_codes = np.empty(n, dtype=np.int32)
+     msg_lengths = np.empty(n, dtype=np.int32)
+     hour_codes = np.empty(n, dtype=np.int8)
+     is_media = np.empty(n, dtype=np.bool_)
+     date_ords = np.empty(n, dtype=np.int64)
+
+     for i, msg in enumerate(enriched_messages):
+          user_codes[i] = user_index.get(msg['user'], -1)
+          msg_lengths[i] = len(msg['message'])
+          hour_codes[i] = _HOUR_INDEX.get(msg['hour_category'], -1)
+          is_media[i] = msg['is_media']
+          # The parser stores the day as an int ordinal, so no date object
+          # is allocated here; fall back to the timestamp for dicts built
+          # by other code paths
+          ord_ = msg.get('date_ord')
+          date_ords[i] = ord_ if ord_ is not None else msg['timestamp'].toordinal()
+
+     # Ordinal day 719163 is 1970-01-01; the shift makes the int64 days
+     # directly viewable as datetime64[D], and ordinal 1 was a Monday so
+     # weekday codes are one modulo away
+     dates = (date_ords - _EPOCH_ORDINAL).astype('datetime64[D]')
+     weekday_codes = ((date_ords - 1) % 7).astype(np.int8)
+
+     return EnrichedColumns(users, user_codes, msg_lengths, hour_codes,
+                            is_media, dates, weekday_codes)
 
+# HELPERS
 def __count_weekdays_in_period(start_date, end_date) -> dict:
      """
      Counts how many Mondays, Tuesdays, etc. exist in a time period.
@@ -35,24 +91,24 @@ def __count_weekdays_in_period(start_date, end_date) -> dict:
      Returns:
          Dict with count for each weekday: {"Monday": 73, "Tuesday": 73, ...}
      """
-     from datetime import timedelta
-     
      WEEKDAYS_NAME = ["Monday", "Tuesday", "Wednesday", "Thursday",
                       "Friday", "Saturday", "Sunday"]
-     
+
      # Convert to date objects if needed
      start = start_date.date() if hasattr(start_date, 'date') else start_date
      end = end_date.date() if hasattr(end_date, 'date') else end_date
-     
-     weekday_counts = {w: 0 for w in WEEKDAYS_NAME}
-     current_date = start
-     
-     while current_date <= end:
-          day_name = WEEKDAYS_NAME[current_date.weekday()]
-          weekday_counts[day_name] += 1
-          current_date += timedelta(days=1)
-     
-     return weekday_counts
+
+     # Closed form instead of walking the period day by day: every weekday
+     # occurs span // 7 times, plus one more for the span % 7 weekdays
+     # starting at start.weekday()
+     span = (end - start).days + 1
+     if span <= 0:
+          return {w: 0 for w in WEEKDAYS_NAME}
+
+     base, remainder = divmod(span, 7)
+     start_weekday = start.weekday()
+     return {weekday: base + (1 if (i - start_weekday) % 7 < remainder else 0)
+             for i, weekday in enumerate(WEEKDAYS_NAME)}
      
 def __calculate_emotion_stats(enriched_messages: list[dict], user_name: str = None) -> dict:
     """
@@ -65,39 +121,56 @@ def __calculate_emotion_stats(enriched_messages: list[dict], user_name: str = No
     Returns:
         Dict with statistics for each emotion (28 total emotions)
     """
-    # GoEmotions 28 emotions
-    EMOTIONS = ['admiration', 'amusement', 'anger', 'annoyance', 'approval', 'caring', 
-                'confusion', 'curiosity', 'desire', 'disappointment', 'disapproval', 
-                'disgust', 'embarrassment', 'excitement', 'fear', 'gratitude', 'grief', 
-                'joy', 'love', 'nervousness', 'optimism', 'pride', 'realization', 
-                'relief', 'remorse', 'sadness', 'surprise', 'neutral']
     if user_name:
          messages = [msg for msg in enriched_messages if msg['user'] == user_name]
     else:
          messages = enriched_messages
 
-    scores = {emotion: [] for emotion in EMOTIONS}
-    for emotion in EMOTIONS:
-        scores[emotion] = [msg['emotions'][emotion] 
-                          for msg in messages 
-                          if msg['emotions'] is not None]
+    # Trivial input: skip the matrix/Counter machinery entirely
+    if not messages:
+        return {emotion: {'avg': 0.0, 'max': 0.0, 'frequency': 0,
+                          'percentage': 0.0, 'strong_count': 0}
+                for emotion in EMOTIONS}
 
-    stats = {}
+    # Pack all scores into one (N, 28) matrix so avg/max/strong-count are
+    # three vectorized column reductions, instead of rescanning the message
+    # list once (or twice) per emotion at Python speed
+    scored = [msg['emotions'] for msg in messages if msg['emotions']]
+    n_emotions = len(EMOTIONS)
+    if scored:
+        arr = np.fromiter(
+            (emotions[e] for emotions in scored for e in EMOTIONS),
+            dtype=np.float32, count=len(scored) * n_emotions
+        ).reshape(-1, n_emotions)
+        # Accumulate in float64: a float32 running sum can shift the
+        # rounded avg by ±0.01 on boundary values versus the old
+        # Python-float accumulation
+        avgs = arr.mean(axis=0, dtype=np.float64)
+        maxs = arr.max(axis=0)
+        strong_counts = (arr > STRONG_EMOTION_THRESHOLD).sum(axis=0)
+    else:
+        avgs = maxs = np.zeros(n_emotions, dtype=np.float32)
+        strong_counts = np.zeros(n_emotions, dtype=np.int64)
 
-    for emotion in EMOTIONS:
-        emotion_scores = scores[emotion]
-        avg = __emotion_avg(emotion_scores)
-        max_score = max(emotion_scores) if emotion_scores else 0.0
-        frequency = __emotion_frequency(messages, emotion)
-        percentage = __emotion_percentage(frequency, messages)
-        strong_count = sum(1 for msg in messages 
-                          if msg['emotions'] and msg['emotions'][emotion] > STRONG_EMOTION_THRESHOLD)
+    # Dominant-emotion frequency: one Counter pass over the labels instead
+    # of one full scan per emotion (Counter hashes the interned label
+    # strings directly — cheaper than round-tripping them through an
+    # object ndarray for np.unique)
+    freq_by_emotion = Counter(msg['dominant_emotion'][0] for msg in messages
+                              if msg.get('dominant_emotion'))
+
+    n_messages = len(messages)
+    stats = {}
+    for i, emotion in enumerate(EMOTIONS):
+        frequency = freq_by_emotion.get(emotion, 0)
+        percentage = (frequency / n_messages * PERCENTAGE_MULTIPLIER
+                      if n_messages else 0.0)
         stats[emotion] = {
-            'avg': round(avg, 2),
-            'max': round(max_score, 2),
+            'avg': round(float(avgs[i]), 2),
+            'max': round(float(maxs[i]), 2),
             'frequency': frequency,
             'percentage': round(percentage, 2),
-            'strong_count': strong_count 
+            'strong_count': int(strong_counts[i])
         }
 
     return stats
@@ -105,10 +178,99 @@ def __calculate_emotion_stats(enriched_messages: list[dict], user_name: str = No
 # compute emotions stats by users
 def calculate_user_emotion_stats(enriched_messages: list[dict], user_name: str) -> dict:
      return __calculate_emotion_stats(enriched_messages, user_name)
+
+def calculate_emotion_stats_by_user(enriched_messages: list[dict], users: list[str]) -> dict:
+     """
+     Computes emotion statistics for every user with a single partition pass.
+
+     Groups messages by user once (O(N)) instead of rescanning the full
+     message list for each user (O(users * N)), then reuses the same
+     per-group stats computation.
+
+     Args:
+         enriched_messages: List of messages with 'emotions' field
+         users: List of usernames to compute stats for
+
+     Returns:
+         Dict mapping user name -> emotion stats dict
+     """
+     by_user = {user: [] for user in users}
+     for msg in enriched_messages:
+          bucket = by_user.get(msg['user'])
+          if bucket is not None:
+               bucket.append(msg)
+     return {user: __calculate_emotion_stats(msgs) for user, msgs in by_user.items()}
 # compute overall emotions stats 
 def calculate_overall_emotion_distribution(enriched_messages: list[dict]) -> dict:
      return __calculate_emotion_stats(enriched_messages)
 
+# Scale factor for wire-quantized emotion stats: 0..1-ish floats become
+# ints (value * QUANT_SCALE, rounded); clients divide back
+QUANT_SCALE = 10_000
+
+def quantize_emotion_stats(stats_by_emotion: dict) -> dict:
+     """
+     Quantize one {emotion: stats} dict for wire transfer.
+
+     avg/max/percentage are probability-like floats whose JSON digits
+     dominate the payload; scaled ints (QUANT_SCALE) are both shorter and
+     cheaper for the encoder to format. Counts pass through unchanged.
+
+     Args:
+         stats_by_emotion: Dict mapping emotion -> stats dict
+
+     Returns:
+         Dict mapping emotion -> quantized stats (avg_q/max_q/
+         percentage_q/frequency/strong_count)
+     """
+     return {
+          emotion: {
+               'avg_q': int(round(st['avg'] * QUANT_SCALE)),
+               'max_q': int(round(st['max'] * QUANT_SCALE)),
+               'percentage_q': int(round(st['percentage'] * QUANT_SCALE)),
+               'frequency': st['frequency'],
+               'strong_count': st['strong_count'],
+          }
+          for emotion, st in stats_by_emotion.items()
+     }
+
+def emotion_stats_to_table(stats_by_user: dict) -> dict:
+     """
+     Flatten {user: {emotion: stats}} into a columnar table.
+
+     One flat list per stat field, length n_users * n_emotions (row-major
+     by user, emotions in EMOTIONS order), so the payload carries no
+     repeated emotion-key strings and no per-(user, emotion) dict. The
+     slot for (user i, emotion j) is i * len(emotions) + j.
+
+     Args:
+         stats_by_user: Dict mapping user -> emotion -> stats dict
+
+     Returns:
+         Dict with users, emotions and parallel avg/max/frequency/
+         percentage/strong_count lists.
+     """
+     users = list(stats_by_user)
+     avg, max_, frequency, percentage, strong_count = [], [], [], [], []
+     for user in users:
+          per_emotion = stats_by_user[user]
+          for emotion in EMOTIONS:
+               st = per_emotion[emotion]
+               avg.append(st['avg'])
+               max_.append(st['max'])
+               frequency.append(st['frequency'])
+               percentage.append(st['percentage'])
+               strong_count.append(st['strong_count'])
+     return {
+          'users': users,
+          'emotions': list(EMOTIONS),
+          'avg': avg,
+          'max': max_,
+          'frequency': frequency,
+          'percentage': percentage,
+          'strong_count': strong_count,
+     }
+
 def calculate_avg_messages_per_day(metadata: dict) -> float:
      """
      Compute messages per day
@@ -134,54 +296,42 @@ def calculate_avg_messages_per_day(metadata: dict) -> float:
      
      return round(metadata['total_messages'] / total_days, 2)
 
-def compute_messages_per_hours_category(enriched_message: list[dict]) -> dict:
-     HOURS = ["00-02", "02-04", "04-06", "06-08", "08-10", "10-12",
-              "12-14", "14-16", "16-18", "18-20", "20-22", "22-24"]
-     hours_dict = {k: 0 for k in HOURS}
-     for msg in enriched_message:
-         hour_category = msg['hour_category']
-         if hour_category:
-              hours_dict[hour_category] += 1
-    
-     return hours_dict
+def compute_messages_per_hours_category(columns: EnrichedColumns) -> dict:
+     valid = columns.hour_codes[columns.hour_codes >= 0]
+     counts = np.bincount(valid, minlength=len(HOURS_CATEGORIES))
+     return {hour: int(count) for hour, count in zip(HOURS_CATEGORIES, counts)}
 
-def compute_avg_and_count_messages_by_day(enriched_messages: list[dict], metadata: dict) -> dict:
+def compute_avg_and_count_messages_by_day(columns: EnrichedColumns, metadata: dict) -> dict:
      """
      Calcola statistiche messaggi per giorno della settimana.
-     
+
      Args:
-         enriched_messages: lista messaggi con timestamp e weekday
+         columns: columnar view from build_columns()
          metadata: dict con start_date e end_date per calcolare il numero totale di giorni
-     
+
      Returns:
          Dict con total_messages e average per ogni giorno della settimana
      """
      WEEKDAYS_NAME = ["Monday", "Tuesday", "Wednesday", "Thursday",
                          "Friday", "Saturday", "Sunday"]
-     weekdays = {w: dict() for w in WEEKDAYS_NAME}
 
-     for msg in enriched_messages:
-          if msg:
-               weekday = msg['weekday']
-               date = msg['timestamp'].date()
-
-               if date not in weekdays[weekday]:
-                    weekdays[weekday][date] = 0
-               weekdays[weekday][date] += 1
+     # One bincount over the int8 weekday codes; the old version built a
+     # dict-of-dicts keyed by (weekday, date) only to sum the dates back out
+     totals = np.bincount(columns.weekday_codes, minlength=7)
 
      # Count how many days of each type exist in the period
      weekday_counts = __count_weekdays_in_period(metadata['start_date'], metadata['end_date'])
-     
+
      # Calculate statistics
      results = {}
-     for weekday in WEEKDAYS_NAME:
-          total_messages = sum(weekdays[weekday].values()) if weekdays[weekday] else 0
+     for code, weekday in enumerate(WEEKDAYS_NAME):
+          total_messages = int(totals[code])
           total_weekdays_in_period = weekday_counts[weekday]
-          
+
           if total_weekdays_in_period > 0:
                average = total_messages / total_weekdays_in_period
                results[weekday] = {
-                    "total_messages": total_messages, 
+                    "total_messages": total_messages,
                     "average": round(average, 2),
                     "days_in_period": total_weekdays_in_period
                }
@@ -190,128 +340,171 @@ def compute_avg_and_count_messages_by_day(enriched_messages: list[dict], metadat
 
      return results
 
-def compute_longest_conversation_streak(enriched_messages: list[dict], metadata: dict) -> dict:
+def compute_longest_conversation_streak(columns: EnrichedColumns, metadata: dict) -> dict:
      """
      Calculates the longest streak of consecutive days where both users responded.
-     
+
      Args:
-         enriched_messages: List of enriched messages with timestamp
+         columns: columnar view from build_columns()
          metadata: Dict with 'users' (list of chat users)
-     
+
      Returns:
          Dict with: days (int), start_date (str), end_date (str)
      """
-     if not enriched_messages or len(metadata.get('users', [])) < 2:
+     if len(columns.dates) == 0 or len(metadata.get('users', [])) < 2:
           return {"days": 0, "start_date": None, "end_date": None}
-          
-     # Group messages by date: {date: {user1, user2}}
-     daily_users = defaultdict(set)
-     for msg in enriched_messages:
-          daily_users[msg['timestamp'].date()].add(msg['user'])
-     
-     # Find days where both users messaged
-     both_days = sorted([date for date, users in daily_users.items() if len(users) >= 2])
-     
-     if not both_days:
+
+     # Distinct users per day without the per-day Python sets: encode each
+     # message as day * K + user, unique the pairs, then count pairs per day
+     days_i8 = columns.dates.astype('i8')
+     n_codes = len(columns.users) + 1  # +1 slot for the -1 "unknown" code
+     pair_keys = np.unique(days_i8 * n_codes
+                           + (columns.user_codes.astype(np.int64) + 1))
+     active_days, users_per_day = np.unique(pair_keys // n_codes,
+                                            return_counts=True)
+
+     # Days where both (>= 2) users messaged
+     both_days = active_days[users_per_day >= 2]
+     if both_days.size == 0:
           return {"days": 0, "start_date": None, "end_date": None}
-     
-     # Find longest streak
-     max_streak = 1
-     current_streak = 1
-     best_start = both_days[0]
-     best_end = both_days[0]
-     streak_start = both_days[0]
-     
-     for i in range(1, len(both_days)):
-          if (both_days[i] - both_days[i-1]).days == 1:  # Consecutive days
-               current_streak += 1
-               if current_streak > max_streak:
-                    max_streak = current_streak
-                    best_start = streak_start
-                    best_end = both_days[i]
-          else:  # Streak broken
-               current_streak = 1
-               streak_start = both_days[i]
-     
+
+     # Streak boundaries in C: day gaps != 1 break the runs; diff of the
+     # break positions gives every run length, argmax keeps the first
+     # longest run, same as the old Python loop
+     gaps = np.diff(both_days)
+     breaks = np.concatenate(([0], np.where(gaps != 1)[0] + 1, [both_days.size]))
+     run_lengths = np.diff(breaks)
+     best = int(run_lengths.argmax())
+     max_streak = int(run_lengths[best])
+     best_start = np.datetime64(int(both_days[breaks[best]]), 'D').item()
+     best_end = np.datetime64(int(both_days[breaks[best] + max_streak - 1]), 'D').item()
+
      return {
           "days": max_streak,
           "start_date": best_start.isoformat(),
           "end_date": best_end.isoformat()
      }
 
-def messages_per_user(enriched_messages: list[dict], metadata: dict) -> dict:
-     users_rate = {user: 0 for user in metadata['users']}
-     for msg in enriched_messages:
-          if msg:
-               users_rate[msg['user']] += 1
+def messages_per_user(columns: EnrichedColumns) -> dict:
+     known = columns.user_codes[columns.user_codes >= 0]
+     counts = np.bincount(known, minlength=len(columns.users))
+     return {user: int(count) for user, count in zip(columns.users, counts)}
 
-     return users_rate
+def avg_message_length_per_user(columns: EnrichedColumns) -> dict:
+     known = columns.user_codes >= 0
+     codes = columns.user_codes[known]
+     counts = np.bincount(codes, minlength=len(columns.users))
+     totals = np.bincount(codes, weights=columns.msg_lengths[known],
+                          minlength=len(columns.users))
 
-def avg_message_length_per_user(enriched_messages: list[dict], metadata: dict) -> dict:
-     users_data = {user: [0, 0] for user in metadata['users']}  # [count, total_length]
-     
-     for msg in enriched_messages:
-          if msg:
-               user = msg['user']
-               length = len(msg['message'])
-               users_data[user][0] += 1
-               users_data[user][1] += length
-     
-     return {user: round(data[1] / data[0], 2) if data[0] > 0 else 0.0 
-             for user, data in users_data.items()}
+     return {user: round(float(total) / count, 2) if count > 0 else 0.0
+             for user, total, count in zip(columns.users, totals, counts)}
+
+def compute_all_basic_stats(enriched_messages: list[dict], metadata: dict) -> dict:
+     """
+     Computes every counting stat from one fused pass over the messages.
+
+     build_columns is the single loop that touches the message dicts; the
+     per-user, hourly and weekday stats are then vectorized reductions on
+     its arrays, so adding them here costs no extra traversal of the list.
+
+     Args:
+         enriched_messages: list of enriched messages
+         metadata: chat metadata with users, start_date, end_date
+
+     Returns:
+         Dict with messages_per_user, avg_message_length_per_user,
+         hourly_distribution, weekday_distribution and longest_streak.
+     """
+     columns = build_columns(enriched_messages, metadata)
+     return {
+          'messages_per_user': messages_per_user(columns),
+          'avg_message_length_per_user': avg_message_length_per_user(columns),
+          'hourly_distribution': compute_messages_per_hours_category(columns),
+          'weekday_distribution': compute_avg_and_count_messages_by_day(columns, metadata),
+          'longest_streak': compute_longest_conversation_streak(columns, metadata)
+     }
 
 def top_emojis(enriched_messages: list[dict], metadata: dict, N: int = 10) -> dict:
-     users_data = {user: defaultdict(int) for user in metadata['users']} 
+     users_texts = {user: [] for user in metadata['users']}
 
      for msg in enriched_messages:
           if msg:
-               emoji_list = emoji.emoji_list(msg['message'])
-               for em_dict in emoji_list:
-                    em = em_dict['emoji']
-                    users_data[msg['user']][em] += 1
-     
-     # Sort by count (descending) and take top N
+               text = msg['message']
+               # Most chat lines are plain ASCII and cannot contain emoji;
+               # isascii() is a C-level flag check, so skipping them avoids
+               # feeding the emoji scanner text that cannot match
+               if text.isascii():
+                    continue
+               users_texts[msg['user']].append(text)
+
+     # One scan per user instead of one per message: the surviving texts
+     # are joined (newlines never appear inside an emoji sequence) and
+     # handed to emoji_list in a single trie pass, then tallied at once.
+     # Top N by count: most_common runs on a heap of N (O(V log N))
+     # instead of sorting the whole per-user emoji vocabulary
      result = {}
-     for user in users_data.keys():
-          sorted_emojis = sorted(users_data[user].items(), key=lambda x: x[1], reverse=True)
-          # Convert tuples to dictionaries
-          result[user] = [{"emoji": em, "count": cnt} for em, cnt in sorted_emojis[:N]]
-     
+     for user, texts in users_texts.items():
+          counts = Counter(
+               em_dict['emoji']
+               for em_dict in emoji.emoji_list('\n'.join(texts))
+          ) if texts else Counter()
+          result[user] = [{"emoji": em, "count": cnt} for em, cnt in counts.most_common(N)]
+
      return result
 
 def top_words_per_user(enriched_messages: list[dict], metadata: dict, N: int = 10) -> dict:
     
-    users_words = {user: defaultdict(int) for user in metadata['users']}
-    
-    # Custom stopwords: usernames + common words from media messages
+    users_words = {user: Counter() for user in metadata['users']}
+
+    # Custom stopwords: usernames + common words from media messages.
+    # The spaCy helpers lowercase their output, so membership checks are
+    # case-exact — no per-token .lower() needed below.
     custom_stopwords = set()
     for user in metadata['users']:
         # Add each word from username (e.g., "John Doe" → john, doe)
         custom_stopwords.update(word.lower() for word in user.split())
-    
+
     # Add words from "<Media omitted>" and similar
     custom_stopwords.update(['medium', 'omit', 'omitted', 'media', 'message', 'deleted'])
+    custom_stopwords = frozenset(custom_stopwords)
     
+    # Use the lemmas cached by analyze_full_chat's single spaCy pass when
+    # present; messages lacking them are collected and lemmatized in one
+    # nlp.pipe batch rather than one spaCy call per message.
+    # PROPN is excluded to avoid person/place names.
+    rows = []  # (user, words) per text message, in order
+    missing_texts = []
+    missing_slots = []
     for msg in enriched_messages:
         # Skip media messages and very short messages
         if msg and msg['message'] and not msg.get('is_media', False):
-            # Use spaCy to clean and lemmatize
-            # Remove PROPN (proper nouns) to avoid person/place names
-            cleaned = process_text_spacy(msg['message'], pos_list=['NOUN', 'VERB', 'ADJ', 'ADV'])
-            words = cleaned.split()
-            
-            for word in words:
-                # Filter: length > MIN_WORD_LENGTH and not in custom stopwords
-                if len(word) > MIN_WORD_LENGTH and word.lower() not in custom_stopwords:
-                    users_words[msg['user']][word] += 1
+            words = msg.get('_lemmas')
+            rows.append([msg['user'], words])
+            if words is None:
+                missing_texts.append(msg['message'])
+                missing_slots.append(len(rows) - 1)
+
+    if missing_texts:
+        lemma_stream = process_texts_spacy_batch(
+            missing_texts, pos_list=['NOUN', 'VERB', 'ADJ', 'ADV'])
+        for slot, cleaned in zip(missing_slots, lemma_stream):
+            rows[slot][1] = cleaned.split()
+
+    # Counter.update runs the counting loop in C; the generator only does
+    # the length/stopword filter
+    for user, words in rows:
+        users_words[user].update(
+            word for word in words
+            if len(word) > MIN_WORD_LENGTH and word not in custom_stopwords)
     
-    # Sort and take top N
+    # Top N by count, without sorting the full vocabulary
     result = {}
     for user, word_counts in users_words.items():
-        sorted_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)
+        top = word_counts.most_common(N)
         # Convert tuples to dictionaries
-        result[user] = [{"word": w, "count": cnt} for w, cnt in sorted_words[:N]]
-    
+        result[user] = [{"word": w, "count": cnt} for w, cnt in top]
+
     return result
 
 
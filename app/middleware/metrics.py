@@ -1,6 +1,6 @@
 """Middleware to track performance metrics and Cloud Run costs."""
 import time
-import psutil
+import resource
 import os
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -16,47 +16,70 @@ REQUEST_COST_PER_MILLION = 0.40  # EUR per million requests
 CONFIGURED_MEMORY_GB = 2.0  # GiB allocated in Cloud Run
 MB_TO_MIB_DIVISOR = 1024  # Conversion factor for memory units
 
+# Folded per-request rates, so the cost math is two multiplies and one add
+CPU_COST_PER_SECOND = CPU_COST_PER_VCPU_SECOND * (os.cpu_count() or 1)
+MEM_COST_PER_SECOND = MEMORY_COST_PER_GIB_SECOND * CONFIGURED_MEMORY_GB
+COST_PER_REQUEST = REQUEST_COST_PER_MILLION / 1_000_000
+# Debug response headers are opt-in: they cost three formatted-string
+# allocations per request and only matter when someone is actively looking
+_DEBUG_HEADERS = os.getenv("METRICS_DEBUG_HEADERS") == "1"
+
+# Endpoints that answer in microseconds with ~100-byte bodies: cost
+# accounting on them measures the middleware, not the request
+DEFAULT_SKIP_PATHS = frozenset({"/health", "/api/v1/public-key"})
+
 class MetricsMiddleware(BaseHTTPMiddleware):
     """Tracks time, memory, and CPU usage for each request."""
-    
+
+    def __init__(self, app, skip_paths: frozenset = DEFAULT_SKIP_PATHS):
+        super().__init__(app)
+        self._skip_paths = skip_paths
+
     async def dispatch(self, request: Request, call_next: Callable):
+        if request.url.path in self._skip_paths:
+            return await call_next(request)
+
         # Pre-request metrics
         start_time = time.time()
-        process = psutil.Process(os.getpid())
-        
-        # Initial memory
-        mem_before = process.memory_info().rss / MB_TO_MIB_DIVISOR / MB_TO_MIB_DIVISOR  # MB
-        cpu_before = process.cpu_percent()
-        
+
         # Execute request
         response = await call_next(request)
-        
-        # Post-request metrics
+
+        # Post-request metrics: one getrusage call per request — a plain
+        # syscall, unlike psutil's /proc parse. ru_maxrss is the peak RSS
+        # (KB on Linux), so the delta shows growth caused by this request.
         duration = time.time() - start_time
-        mem_after = process.memory_info().rss / MB_TO_MIB_DIVISOR / MB_TO_MIB_DIVISOR  # MB
-        cpu_after = process.cpu_percent()
-        
+
+        # Nothing consumes the sample when INFO logging is off and debug
+        # headers are disabled — skip the syscall and the cost math entirely
+        log_enabled = logger.isEnabledFor(logging.INFO)
+        if not (log_enabled or _DEBUG_HEADERS):
+            return response
+
+        mem_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / MB_TO_MIB_DIVISOR  # MB
+        mem_before = getattr(request.app.state, 'last_rss_mb', mem_after)
+        request.app.state.last_rss_mb = mem_after
+
         # Calculate Cloud Run costs (europe-west1 pricing)
-        cpu_count = os.cpu_count() or 1
-        
-        cpu_cost = duration * cpu_count * CPU_COST_PER_VCPU_SECOND
-        mem_cost = duration * CONFIGURED_MEMORY_GB * MEMORY_COST_PER_GIB_SECOND
-        request_cost = REQUEST_COST_PER_MILLION / 1_000_000
-        total_cost = cpu_cost + mem_cost + request_cost
-        
-        # Log metrics
-        logger.info(
-            f"[METRICS] "
-            f"Path: {request.url.path} | "
-            f"Duration: {duration:.2f}s | "
-            f"Memory: {mem_before:.0f}->{mem_after:.0f} MB (Delta {mem_after-mem_before:+.0f}) | "
-            f"CPU: {cpu_after:.1f}% | "
-            f"Cost: EUR {total_cost:.6f} (CPU: EUR {cpu_cost:.6f}, MEM: EUR {mem_cost:.6f}, REQ: EUR {request_cost:.6f})"
-        )
-        
-        # Add custom headers for debugging
-        response.headers["X-Response-Time"] = f"{duration:.2f}s"
-        response.headers["X-Memory-Usage"] = f"{mem_after:.0f}MB"
-        response.headers["X-Request-Cost-EUR"] = f"{total_cost:.6f}"
-        
+        cpu_cost = duration * CPU_COST_PER_SECOND
+        mem_cost = duration * MEM_COST_PER_SECOND
+        total_cost = cpu_cost + mem_cost + COST_PER_REQUEST
+
+        # Log metrics (skip the formatting entirely when INFO is off)
+        if log_enabled:
+            logger.info(
+                "[METRICS] Path: %s | Duration: %.2fs | "
+                "Memory: %.0f->%.0f MB (Delta %+.0f) | "
+                "Cost: EUR %.6f (CPU: EUR %.6f, MEM: EUR %.6f, REQ: EUR %.6f)",
+                request.url.path, duration,
+                mem_before, mem_after, mem_after - mem_before,
+                total_cost, cpu_cost, mem_cost, COST_PER_REQUEST
+            )
+
+        # Add custom headers for debugging (set METRICS_DEBUG_HEADERS=1)
+        if _DEBUG_HEADERS:
+            response.headers["X-Response-Time"] = f"{duration:.2f}s"
+            response.headers["X-Memory-Usage"] = f"{mem_after:.0f}MB"
+            response.headers["X-Request-Cost-EUR"] = f"{total_cost:.6f}"
+
         return response
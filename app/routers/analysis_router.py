@@ -1,12 +1,33 @@
+import asyncio
+import codecs
+import hashlib
 import os
+from base64 import b64decode
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Literal, Union
 from nacl.exceptions import CryptoError
 from app.security.encryption import NaClEnvelopeEncryption
-from fastapi import APIRouter, HTTPException, status, UploadFile
+from fastapi import APIRouter, Header, HTTPException, Request, status, UploadFile
+from fastapi.responses import ORJSONResponse
 from app.schemas import analysis as schemas
-from analysis import chat_parser, analysis_chat
+from analysis import chat_parser, analysis_chat, stats_calculator
 
 router = APIRouter()
 
+# Upload size cap (bytes). A 20MB WhatsApp export is already years of
+# very active chat; anything bigger is almost certainly abuse.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+_READ_CHUNK_BYTES = 1 << 20  # 1MB reads while streaming the upload
+
+@lru_cache(maxsize=1)
+def _build_encryption_helper(private_key: str) -> NaClEnvelopeEncryption:
+    # Key caching is only useful for deployments whose clients reuse a
+    # long-lived public key; with ephemeral keys it never hits, so off by default
+    key_cache_size = int(os.getenv("ENCRYPTION_KEY_CACHE_SIZE", "0"))
+    return NaClEnvelopeEncryption(private_key, key_cache_size=key_cache_size)
+
 def _get_encryption_helper() -> NaClEnvelopeEncryption:
     """Lazy-load encryption helper; raises HTTPException if SERVER_PRIVATE_KEY missing."""
     private_key = os.getenv("SERVER_PRIVATE_KEY")
@@ -15,17 +36,120 @@ def _get_encryption_helper() -> NaClEnvelopeEncryption:
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Encryption not configured: SERVER_PRIVATE_KEY environment variable missing"
         )
-    helper = getattr(_get_encryption_helper, "_helper", None)
-    if helper is None:
-        helper = NaClEnvelopeEncryption(private_key)
-        setattr(_get_encryption_helper, "_helper", helper)
-    return helper
+    return _build_encryption_helper(private_key)
+
+# Analyses are deterministic for a given chat text and repeat uploads of
+# the same export are common (users re-testing, page reloads), so results
+# are cached by content hash — a hit skips the full parse+model pipeline.
+# Keys are SHA-256 digests, not the texts, so the cache never pins the
+# multi-MB upload strings in memory.
+_RESULT_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "32"))
+_result_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+# Cloud Run provisions 2 vCPUs but one analysis pins a single core behind
+# the GIL; a small process pool lets concurrent uploads actually overlap.
+# Each worker loads its own model stack, so worker count trades memory for
+# parallelism — ANALYSIS_WORKERS=0 falls back to in-process worker threads.
+_ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+_analysis_pool = None
+
+def _load_worker_models():
+    """Pool initializer: load spaCy/VADER and the emotion model once per
+    worker process, so no user request pays the cold-load cost."""
+    from analysis import analysis_core, analysis_emotion
+    analysis_core.warmup()
+    analysis_emotion.warmup()
+
+def _worker_ready(_):
+    return True
+
+def _get_analysis_pool() -> ProcessPoolExecutor:
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = ProcessPoolExecutor(
+            max_workers=_ANALYSIS_WORKERS,
+            initializer=_load_worker_models,
+        )
+    return _analysis_pool
+
+def warmup_analysis_pool() -> bool:
+    """Spawn the pool workers at startup so model loading happens before
+    the first request. Returns False when the pool is disabled, in which
+    case the caller should warm the models in-process instead."""
+    if _ANALYSIS_WORKERS <= 0:
+        return False
+    # One barrier task per worker forces every process to spawn (and run
+    # its initializer) now rather than on the first analysis
+    list(_get_analysis_pool().map(_worker_ready, range(_ANALYSIS_WORKERS)))
+    return True
 
-def _analyze_chat_text(text: str):
+def shutdown_analysis_pool():
+    """Tear down the worker pool; called from the app shutdown hook."""
+    global _analysis_pool
+    if _analysis_pool is not None:
+        _analysis_pool.shutdown(wait=False, cancel_futures=True)
+        _analysis_pool = None
+
+def _analyze_chat_text(text: str) -> dict:
+    """Pure compute path: parse + full analysis. Top-level (picklable)
+    so it can be shipped to a pool worker."""
     messages = chat_parser.parse_whatsapp_export(text)
     metadata = chat_parser.get_chat_metadata(messages)
     return analysis_chat.analyze_full_chat(messages, metadata)
 
+def _shape_response(results: dict, columnar: bool, precision: str) -> dict:
+    """Apply the optional wire-format variants.
+
+    columnar=true swaps the per-user emotion stats for the table form
+    (schemas.EmotionStatsTable); precision=low quantizes the emotion
+    stats to scaled ints (schemas.EmotionStatsQuantized) and is ignored
+    when columnar is requested, which already shrinks the payload.
+    Shallow-copies so cached results are never mutated."""
+    if columnar:
+        out = dict(results)
+        out['user_emotion_stats'] = stats_calculator.emotion_stats_to_table(
+            results['user_emotion_stats']
+        )
+        return out
+    if precision == 'low':
+        out = dict(results)
+        out['user_emotion_stats'] = {
+            user: stats_calculator.quantize_emotion_stats(stats)
+            for user, stats in results['user_emotion_stats'].items()
+        }
+        out['overall_emotion_distribution'] = stats_calculator.quantize_emotion_stats(
+            results['overall_emotion_distribution']
+        )
+        return out
+    return results
+
+async def _run_analysis(text: str, key: str = None) -> dict:
+    """Cache-checked analysis. The cache lives in the parent process;
+    only misses are dispatched to the pool.
+
+    Callers that already hold the raw bytes pass their digest as `key`,
+    which skips re-encoding the text just to hash it."""
+    if key is None:
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    cached = _result_cache.get(key)
+    if cached is not None:
+        _result_cache.move_to_end(key)
+        return cached
+
+    if _ANALYSIS_WORKERS > 0:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            _get_analysis_pool(), _analyze_chat_text, text
+        )
+    else:
+        results = await asyncio.to_thread(_analyze_chat_text, text)
+
+    if _RESULT_CACHE_SIZE > 0:
+        _result_cache[key] = results
+        if len(_result_cache) > _RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return results
+
 # --- SINGLE ANALYSIS ENDPOINT ---
 @router.get("/public-key",
             response_model=schemas.PublicKey,
@@ -38,11 +162,23 @@ async def get_public_key():
 
 
 @router.post("/analyze-conversation",
-             response_model=schemas.ChatAnalysisOutput,
+             response_model=Union[schemas.ChatAnalysisOutput,
+                                  schemas.ChatAnalysisColumnarOutput,
+                                  schemas.ChatAnalysisQuantizedOutput],
+             response_class=ORJSONResponse,
              status_code=status.HTTP_200_OK,
              summary="Chat parsing and analysing WhatsApp conversation",
              tags=["Analysis"])
-async def analyzer_chat(file: UploadFile):
+async def analyzer_chat(request: Request, file: UploadFile, columnar: bool = False, precision: Literal["full", "low"] = "full"):
+    # Reject obviously oversized uploads from the declared Content-Length
+    # before touching the body at all — the streaming cap below still
+    # covers clients that lie about (or omit) the header.
+    declared_size = int(request.headers.get("content-length") or 0)
+    if declared_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large: limit is {MAX_UPLOAD_BYTES} bytes"
+        )
     if not file.filename.endswith(".txt"):
         raise HTTPException(
             status_code=400,
@@ -54,28 +190,57 @@ async def analyzer_chat(file: UploadFile):
             detail="Invalid content type"
         )
     
-    content = await file.read()     # bytes
-    text = content.decode('utf-8')  # to str    
+    # Decode incrementally instead of read-then-decode: holding the raw
+    # bytes and the full decoded str at once roughly triples peak memory
+    # for a large export. Streaming keeps one chunk in flight and bounds
+    # the total size mid-stream instead of after the fact.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    hasher = hashlib.sha256()
+    chunks = []
+    total_bytes = 0
+    while True:
+        block = await file.read(_READ_CHUNK_BYTES)
+        if not block:
+            break
+        total_bytes += len(block)
+        if total_bytes > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large: limit is {MAX_UPLOAD_BYTES} bytes"
+            )
+        hasher.update(block)
+        chunks.append(decoder.decode(block))
+    chunks.append(decoder.decode(b'', final=True))
+    text = "".join(chunks)
 
     try:
-        results = _analyze_chat_text(text)
+        results = await _run_analysis(text, key=hasher.hexdigest())
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing chat: {str(e)}"
         )
-    
-    return results 
+
+    # The pipeline emits JSON-ready dicts in the ChatAnalysisOutput shape;
+    # returning the response directly skips Pydantic re-validating data the
+    # server just computed (response_model stays for the OpenAPI contract).
+    return ORJSONResponse(_shape_response(results, columnar, precision))
 
 @router.post("/analyze-conversation-encrypted",
-             response_model=schemas.ChatAnalysisOutput,
+             response_model=Union[schemas.ChatAnalysisOutput,
+                                  schemas.ChatAnalysisColumnarOutput,
+                                  schemas.ChatAnalysisQuantizedOutput],
+             response_class=ORJSONResponse,
              status_code=status.HTTP_200_OK,
              summary="Chat parsing and analysing Encrypted WhatsApp conversation",
              tags=["Analysis"])
-async def analyze_encrypted(payload: schemas.EncryptedChatPayload):
+async def analyze_encrypted(payload: schemas.EncryptedChatPayload, columnar: bool = False, precision: Literal["full", "low"] = "full"):
     helper = _get_encryption_helper()
     try:
-        decrypted_bytes = helper.decrypt(
+        # base64 + AEAD over a multi-MB ciphertext holds the GIL long
+        # enough to stall the loop; run it in a worker thread
+        decrypted_bytes = await asyncio.to_thread(
+            helper.decrypt,
             payload.client_public_key,
             payload.nonce,
             payload.ciphertext,
@@ -93,9 +258,79 @@ async def analyze_encrypted(payload: schemas.EncryptedChatPayload):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Decrypted payload is not valid UTF-8"
         )
+    key = hashlib.sha256(decrypted_bytes).hexdigest()
+
+    try:
+        # Direct response: skips response_model re-validation (see analyzer_chat)
+        return ORJSONResponse(_shape_response(await _run_analysis(text, key=key), columnar, precision))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing chat: {e}",
+        )
+
+
+@router.post("/analyze-conversation-encrypted-binary",
+             response_model=Union[schemas.ChatAnalysisOutput,
+                                  schemas.ChatAnalysisColumnarOutput,
+                                  schemas.ChatAnalysisQuantizedOutput],
+             response_class=ORJSONResponse,
+             status_code=status.HTTP_200_OK,
+             summary="Chat analysis for an encrypted conversation sent as raw bytes",
+             tags=["Analysis"])
+async def analyze_encrypted_binary(
+    request: Request,
+    file: UploadFile,
+    x_client_public_key: str = Header(alias="X-Client-Public-Key"),
+    x_nonce: str = Header(alias="X-Nonce"),
+    columnar: bool = False,
+    precision: Literal["full", "low"] = "full",
+):
+    """Like /analyze-conversation-encrypted, but the ciphertext travels as
+    a raw multipart field instead of base64 inside JSON. Only the 32-byte
+    public key and 24-byte nonce stay base64 (in headers); skipping the
+    base64 round-trip on the ciphertext saves a full pass and ~33% of the
+    transport size for large chats."""
+    declared_size = int(request.headers.get("content-length") or 0)
+    if declared_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large: limit is {MAX_UPLOAD_BYTES} bytes"
+        )
+
+    helper = _get_encryption_helper()
+    ciphertext = await file.read()
+    if len(ciphertext) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large: limit is {MAX_UPLOAD_BYTES} bytes"
+        )
+
+    try:
+        decrypted_bytes = await asyncio.to_thread(
+            helper.decrypt_raw,
+            b64decode(x_client_public_key),
+            b64decode(x_nonce),
+            ciphertext,
+        )
+    except (CryptoError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid encrypted payload"
+        )
+
+    try:
+        text = decrypted_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Decrypted payload is not valid UTF-8"
+        )
+    key = hashlib.sha256(decrypted_bytes).hexdigest()
 
     try:
-        return _analyze_chat_text(text)
+        # Direct response: skips response_model re-validation (see analyzer_chat)
+        return ORJSONResponse(_shape_response(await _run_analysis(text, key=key), columnar, precision))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,17 +1,23 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Dict, List, Optional
 
 # --- Chat Analysis Schemas ---
 
-class PublicKey(BaseModel):
+class _Schema(BaseModel):
+    """Shared base: validator/serializer build is deferred to first use,
+    so importing this module at cold start doesn't pay for building all
+    the model cores up front."""
+    model_config = ConfigDict(defer_build=True)
+
+class PublicKey(_Schema):
     public_key: str
 
-class EncryptedChatPayload(BaseModel):
+class EncryptedChatPayload(_Schema):
     client_public_key: str
     nonce: str
     ciphertext: str
 
-class EmotionStats(BaseModel):
+class EmotionStats(_Schema):
     """Statistics for a single emotion"""
     avg: float
     max: float
@@ -19,36 +25,63 @@ class EmotionStats(BaseModel):
     percentage: float
     strong_count: int
 
-class WeekdayStats(BaseModel):
+class EmotionStatsQuantized(_Schema):
+    """Wire-quantized emotion stats, returned when ?precision=low.
+
+    avg_q/max_q/percentage_q are the float values multiplied by 10000
+    and rounded to ints; divide by 10000 to recover the floats.
+    """
+    avg_q: int
+    max_q: int
+    percentage_q: int
+    frequency: int
+    strong_count: int
+
+class EmotionStatsTable(_Schema):
+    """Columnar (structure-of-arrays) form of per-user emotion stats.
+
+    Parallel lists of length len(users) * len(emotions), row-major by
+    user: the slot for (user i, emotion j) is i * len(emotions) + j.
+    Returned instead of the nested dicts when ?columnar=true.
+    """
+    users: List[str]
+    emotions: List[str]
+    avg: List[float]
+    max: List[float]
+    frequency: List[int]
+    percentage: List[float]
+    strong_count: List[int]
+
+class WeekdayStats(_Schema):
     """Statistics for a single weekday"""
     total_messages: int
     average: float
     days_in_period: int
 
-class StreakInfo(BaseModel):
+class StreakInfo(_Schema):
     """Information about conversation streak"""
     days: int
     start_date: Optional[str]
     end_date: Optional[str]
 
-class EmojiCount(BaseModel):
+class EmojiCount(_Schema):
     """Single emoji with count"""
     emoji: str
     count: int
 
-class WordCount(BaseModel):
+class WordCount(_Schema):
     """Single word with count"""
     word: str
     count: int
 
-class SentimentScore(BaseModel):
+class SentimentScore(_Schema):
     """VADER sentiment scores"""
     pos: float
     neu: float
     neg: float
     compound: float
 
-class ChatMetadata(BaseModel):
+class ChatMetadata(_Schema):
     """Metadata about the chat"""
     total_messages: int
     users: List[str]
@@ -59,7 +92,7 @@ class ChatMetadata(BaseModel):
     media_by_type: Dict[str, int]
     media_by_user: Dict[str, int]
 
-class ChatAnalysisOutput(BaseModel):
+class ChatAnalysisOutput(_Schema):
     """Complete output for chat analysis"""
     metadata: ChatMetadata
     user_emotion_stats: Dict[str, Dict[str, EmotionStats]]  # "user_1" -> emotion -> stats
@@ -73,3 +106,14 @@ class ChatAnalysisOutput(BaseModel):
     avg_message_length_per_user: Dict[str, float]  # "user_1" -> avg_length
     top_emojis_per_user: Dict[str, List[EmojiCount]]  # "user_1" -> list of emojis
     top_words_per_user: Dict[str, List[WordCount]]  # "user_1" -> list of words
+
+class ChatAnalysisColumnarOutput(ChatAnalysisOutput):
+    """ChatAnalysisOutput shape returned when ?columnar=true: the per-user
+    emotion stats arrive as one structure-of-arrays table."""
+    user_emotion_stats: EmotionStatsTable
+
+class ChatAnalysisQuantizedOutput(ChatAnalysisOutput):
+    """ChatAnalysisOutput shape returned when ?precision=low: emotion
+    stats carry scaled-int fields (see EmotionStatsQuantized)."""
+    user_emotion_stats: Dict[str, Dict[str, EmotionStatsQuantized]]
+    overall_emotion_distribution: Dict[str, EmotionStatsQuantized]
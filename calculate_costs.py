@@ -13,8 +13,7 @@ Cloud Run Pricing (europe-west1):
 """
 
 # CONSTANTS
-COLD_START_RATIO = 0.1  # 10% of requests have cold starts
-WARM_REQUEST_RATIO = 0.9  # 90% of requests are warm
+COLD_START_RATIO = 0.1  # 10% of requests have cold starts; the rest are warm
 DAYS_PER_MONTH = 30  # Standard month length
 PRICING_CPU_PER_VCPU_SEC = 0.00002400  # EUR
 PRICING_MEM_PER_GIB_SEC = 0.00000250  # EUR
@@ -61,9 +60,11 @@ def calculate_monthly_cost(requests_per_day: int, days: int):
     
     total_requests = requests_per_day * days
     
-    # Assume 10% cold starts
-    warm_requests = int(total_requests * WARM_REQUEST_RATIO)
-    cold_requests = int(total_requests * COLD_START_RATIO)
+    # Cold starts per COLD_START_RATIO, warm as the exact remainder so
+    # the buckets always sum to the total (two separate float-ratio
+    # truncations could silently drop a request between them)
+    cold_requests = round(total_requests * COLD_START_RATIO)
+    warm_requests = total_requests - cold_requests
     
     # Total execution time
     total_duration = (warm_requests * AVG_DURATION_SECONDS) + (cold_requests * (AVG_DURATION_SECONDS + COLD_START_SECONDS))
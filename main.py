@@ -1,6 +1,13 @@
-from fastapi import FastAPI
+import orjson
+import os
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers.analysis_router import router as analysis_router
+from fastapi.responses import ORJSONResponse
+from app.routers.analysis_router import (
+    router as analysis_router,
+    shutdown_analysis_pool,
+    warmup_analysis_pool,
+)
 from app.middleware.metrics import MetricsMiddleware
 import logging
 
@@ -13,43 +20,135 @@ logging.basicConfig(
 app = FastAPI(
     title="MoodSense API",
     description="API for WhatApp conversation parsing, computing statistics on emotions and text.",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson everywhere: every JSON body (including docs and the small
+    # utility endpoints) goes through the C encoder instead of json.dumps
+    default_response_class=ORJSONResponse,
 )
 
 # Metrics middleware must be added before CORS
 app.add_middleware(MetricsMiddleware)
 
-# CORS middleware - restrict to your actual frontend domains
-allowed_origins = [
-    "https://moodsense-38104758698.europe-west1.run.app",  # Cloud Run production
-    "http://localhost:3000",  # Local dev (React/Next.js)
-    "http://localhost:5173",  # Local dev (Vite)
-]
+# CORS origins come from the environment so one image serves every
+# deploy target; the default covers Cloud Run production plus local dev
+# (React/Next.js on 3000, Vite on 5173)
+_DEFAULT_ORIGINS = (
+    "https://moodsense-38104758698.europe-west1.run.app,"
+    "http://localhost:3000,"
+    "http://localhost:5173"
+)
+allowed_origins = tuple(
+    filter(None, os.getenv("CORS_ORIGINS", _DEFAULT_ORIGINS).split(","))
+)
+
+class FrozenOriginCORSMiddleware(CORSMiddleware):
+    """CORSMiddleware that checks origins against a frozenset.
+
+    The stock middleware scans the allow_origins list per request; a set
+    lookup is O(1) regardless of how many origins a deploy configures.
+    Regex origins are not supported (we never use allow_origin_regex).
+    """
+
+    def __init__(self, app, **kwargs) -> None:
+        super().__init__(app, **kwargs)
+        self._origin_set = frozenset(self.allow_origins)
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        return self.allow_all_origins or origin in self._origin_set
 
 app.add_middleware(
-    CORSMiddleware,
+    FrozenOriginCORSMiddleware,
     allow_origins=allowed_origins,  # Specific domains only
     allow_credentials=False,  # Set True only if using cookies/auth
     allow_methods=["GET", "POST"],  # Only methods you actually use
     allow_headers=["*"],  # Can restrict to ["Content-Type", "Authorization"] if needed
 )
 
+class HealthMiddleware:
+    """Raw ASGI short-circuit for /health.
+
+    Probes are the most frequent request this service sees; answering
+    them here keeps them off the whole middleware chain (CORS, metrics)
+    and the routing table. Added last, so it wraps outermost.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/health":
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": _HEALTH_BYTES})
+            return
+        await self.app(scope, receive, send)
+
+app.add_middleware(HealthMiddleware)
+
 app.include_router(analysis_router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def warmup_models():
+    """Load spaCy, VADER and the emotion model at startup so the first
+    analysis request doesn't pay the multi-second cold-load cost. With
+    the worker pool enabled the models live in the workers, so the parent
+    skips its own copy and keeps one model stack per analysis process."""
+    if warmup_analysis_pool():
+        return
+    from analysis import analysis_core, analysis_emotion
+    analysis_core.warmup()
+    analysis_emotion.warmup()
+
+@app.on_event("startup")
+async def warm_openapi():
+    """Generate and cache the OpenAPI schema before traffic arrives, so
+    the first /docs visitor doesn't pay for building it."""
+    app.openapi()
+
+@app.on_event("shutdown")
+async def teardown_workers():
+    shutdown_analysis_pool()
+
+# Static bodies serialized once at import: probes hit /health many times
+# a second, and re-encoding the same constant dict per request is pure
+# waste — the handlers just hand a ready byte buffer to the ASGI send path
+_ROOT_BYTES = orjson.dumps({
+    "message": "MoodSense API API is running (stateless)",
+    "version": "1.0.0",
+    "endpoints": {
+        "docs": "/docs",
+        "analyze-conversation": "/api/v1/analyze-single",
+    }
+})
+_HEALTH_BYTES = b'{"status":"healthy"}'
+
 @app.get("/", tags=["Root"])
 async def read_root():
-    return {
-        "message": "MoodSense API API is running (stateless)",
-        "version": "1.0.0",
-        "endpoints": {
-            "docs": "/docs",
-            "analyze-conversation": "/api/v1/analyze-single",
-        }
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
-@app.get("/health", tags=["Health"])
+@app.get("/health", tags=["Health"], include_in_schema=False)
 async def health_check():
-    return {"status": "healthy"}
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 # For local development: uvicorn main:app --reload
-# For Cloud Run: the Dockerfile CMD handles port binding via $PORT
\ No newline at end of file
+# For Cloud Run: the Dockerfile CMD handles port binding via $PORT
+if __name__ == "__main__":
+    import uvicorn
+
+    # Each uvicorn worker is a full process with its own analysis pool
+    # and model stack, so worker count is a memory budget as much as a
+    # CPU one — WEB_CONCURRENCY overrides the cpu_count default.
+    # limit_concurrency sheds excess load with 503s instead of queueing
+    # requests behind minute-long analyses.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8080")),
+        workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=int(os.getenv("LIMIT_CONCURRENCY", "64")),
+    )
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Regression tests for the WhatsApp parser.
+
+The string parser sweeps the whole export with one MULTILINE regex while
+the stream parser matches line by line; these tests pin the two to
+identical output, including the empty-message header case where a
+newline-crossing separator once made the sweep swallow the next header.
+"""
+import io
+import os
+
+from analysis.chat_parser import parse_whatsapp_export, parse_whatsapp_export_stream
+
+SAMPLE_EXPORT = os.path.join(
+    os.path.dirname(__file__), '..',
+    'dart_example', 'wa_export_2000_messages_english.txt'
+)
+
+_COMPARED_KEYS = ('timestamp', 'user', 'message', 'message_length',
+                  'is_media', 'media_type', 'is_system')
+
+
+def test_string_and_stream_parsers_agree_on_sample_export():
+    with open(SAMPLE_EXPORT, encoding='utf-8') as fp:
+        content = fp.read()
+
+    from_string = parse_whatsapp_export(content)
+    from_stream = parse_whatsapp_export_stream(io.StringIO(content))
+
+    assert len(from_string) == len(from_stream)
+    for msg_string, msg_stream in zip(from_string, from_stream):
+        for key in _COMPARED_KEYS:
+            assert msg_string[key] == msg_stream[key]
+
+
+def test_empty_message_header_does_not_swallow_next_line():
+    # "Mario:" with no trailing space is not a valid header (the per-line
+    # parser never matched it); the full-text sweep must not let it
+    # consume the next line as its message text
+    content = "11/10/2024, 14:23 - Mario:\n11/10/2024, 14:25 - Luigi: hi"
+
+    messages = parse_whatsapp_export(content)
+
+    assert len(messages) == 1
+    assert messages[0]['user'] == 'Luigi'
+    assert messages[0]['message'] == 'hi'
+    assert messages[0]['timestamp'].strftime('%H:%M') == '14:25'